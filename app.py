@@ -2,13 +2,14 @@ from __future__ import annotations
 
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict
 
 from flask import Flask, render_template, request, redirect, url_for, flash, session
 from dotenv import load_dotenv
 
 from llm import GeminiClient, build_report_prompt
-from db import save_report, init_db, bootstrap_default_admin, create_interview, get_interview, update_interview_answer, complete_interview
+from db import save_report, init_db, bootstrap_default_admin, create_interview, get_interview, get_interview_state, append_interview_answer, get_report_status, set_report_error
 
 load_dotenv()  # Load variables from .env (e.g., GOOGLE_API_KEY)
 
@@ -16,78 +17,143 @@ app = Flask(__name__)
 app.secret_key = os.getenv("FLASK_SECRET_KEY", "dev-secret")
 
 
-def extract_pdf_text(file_storage) -> str:
-    """Extract text from uploaded PDF. Try pypdf first; fallback to OCR if available."""
-    # Save to a temp path
+def _ocr_images(images) -> str:
+    """OCR a list of PIL page images, running all pages concurrently.
+
+    Tesseract runs as a separate subprocess per page, so pages are processed
+    in parallel across cores via aiopytesseract, bounded by OCR_CONCURRENCY
+    (defaults to the CPU count).
+    """
+    import asyncio
     import tempfile
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-        file_storage.save(tmp.name)
-        pdf_path = tmp.name
+    import aiopytesseract
+
+    concurrency = int(os.getenv("OCR_CONCURRENCY", os.cpu_count() or 1))
+
+    async def _ocr_page(path: str, sem: "asyncio.Semaphore") -> str:
+        async with sem:
+            return await aiopytesseract.image_to_string(path)
+
+    async def _ocr_all(paths) -> list:
+        sem = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(*[_ocr_page(p, sem) for p in paths])
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = []
+        for i, img in enumerate(images):
+            path = os.path.join(tmp_dir, f"page_{i}.png")
+            img.save(path, "PNG")
+            paths.append(path)
+        results = asyncio.run(_ocr_all(paths))
+
+    return "\n".join(results)
+
+
+def extract_pdf_text(file_storage) -> str:
+    """Extract text from uploaded PDF. Try PyMuPDF first; fallback to OCR if available.
+
+    The upload is processed entirely in memory; no tempfile round-trip.
+    """
+    data = file_storage.read()
 
     text = ""
     try:
-        from pypdf import PdfReader
+        import fitz  # PyMuPDF
 
-        reader = PdfReader(pdf_path)
-        for page in reader.pages:
-            page_text = page.extract_text() or ""
-            text += page_text + "\n"
+        doc = fitz.open(stream=data, filetype="pdf")
+        # list comprehension: str.join materializes generators into a list
+        # anyway, so hand it the list directly
+        text = "\n".join([page.get_text("text") for page in doc])
+        doc.close()
     except Exception:
         text = ""
 
+    # Strip once up front; the same string is both checked and returned
+    text = text.strip()
+
     # If no text (possibly scanned), try OCR if available
-    if not text.strip():
+    if not text:
         try:
-            from pdf2image import convert_from_path
-            import pytesseract
-
-            images = convert_from_path(pdf_path)
-            ocr_texts = [pytesseract.image_to_string(img) for img in images]
-            text = "\n".join(ocr_texts)
+            from pdf2image import convert_from_bytes
+
+            # 200 DPI grayscale is plenty for single-column resume text and
+            # gives Tesseract a 3x smaller buffer than RGB; thread_count
+            # parallelizes Poppler's rasterization across pages.
+            images = convert_from_bytes(
+                data, dpi=200, grayscale=True, thread_count=os.cpu_count() or 1
+            )
+            text = _ocr_images(images).strip()
         except Exception:
             pass
 
-    try:
-        os.remove(pdf_path)
-    except Exception:
-        pass
+    return text
+
+
+# Question categories and what each per-category LLM call should produce.
+QUESTION_CATEGORIES = {
+    "general": "5 concise warm-up questions referencing resume content",
+    "technical": "8 tailored questions (concept + practical), matching the stack/skills in the resume",
+    "project": "5 questions about projects explicitly mentioned in the resume",
+    "experience": "5 questions about responsibilities, impact, challenges referenced in the resume",
+}
 
-    return text.strip()
 
+# Static prompt preamble resolved once at import; per-request values are
+# substituted via .format() instead of re-concatenating the literal each call.
+_CATEGORY_QUESTIONS_TEMPLATE = (
+    "Read the candidate resume text and generate interview questions strictly grounded in that text.\n"
+    "Return ONLY a JSON array of strings containing {spec} ({category} category).\n"
+    "Rules:\n"
+    "- Do NOT include topics not present or clearly implied by the resume.\n"
+    "- If information is missing, ask clarifying questions tied to the resume content (not generic).\n"
+    "Output must be a valid JSON array of strings.\n\n"
+    "Candidate: {name}, {email}, {college}\n"
+    "Resume Text:\n{cv_text}"
+)
 
-def build_question_sets_prompt(cv_text: str, meta: Dict[str, str]) -> str:
-    """Prompt to produce categorized question sets in JSON.
 
-    Expected JSON keys:
-    - general (5 short questions)
-    - technical (8 questions, increasing difficulty)
-    - project (5 questions about projects in resume)
-    - experience (5 questions about roles/responsibilities)
+def build_category_questions_prompt(category: str, spec: str, cv_text: str, meta: Dict[str, str]) -> str:
+    """Prompt to produce one category of interview questions as a JSON array.
+
+    One focused prompt per category lets /start issue the four LLM calls
+    concurrently instead of one large combined prompt.
     """
-    name = meta.get("name", "Candidate")
-    college = meta.get("college", "")
-    email = meta.get("email", "")
-    return (
-        "Read the candidate resume text and generate interview questions strictly grounded in that text.\n"
-        "Return ONLY a JSON object with keys: general, technical, project, experience.\n"
-        "Rules:\n"
-        "- Do NOT include topics not present or clearly implied by the resume.\n"
-        "- If information is missing, ask clarifying questions tied to the resume content (not generic).\n"
-        "- general: 5 concise warm-up questions referencing resume content.\n"
-        "- technical: 8 tailored questions (concept + practical), matching the stack/skills in the resume.\n"
-        "- project: 5 questions about projects explicitly mentioned in the resume.\n"
-        "- experience: 5 about responsibilities, impact, challenges referenced in the resume.\n"
-        "Output must be valid JSON with arrays of strings for each key.\n\n"
-        f"Candidate: {name}, {email}, {college}\n"
-        f"Resume Text:\n{cv_text}"
+    return _CATEGORY_QUESTIONS_TEMPLATE.format(
+        spec=spec,
+        category=category,
+        name=meta.get("name", "Candidate"),
+        email=meta.get("email", ""),
+        college=meta.get("college", ""),
+        cv_text=cv_text,
     )
 
 
+def _strip_code_fences(s: str) -> str:
+    """Strip markdown code fences the LLM sometimes wraps around JSON output."""
+    s = s.strip()
+    if s.startswith("```"):
+        s = s.strip("` \n")
+        if s.lower().startswith("json"):
+            s = s[4:].strip()
+    return s
+
+
 init_db()
 bootstrap_default_admin()
 gemini = GeminiClient()
 
+# Question generation fans its four category prompts out across these
+# threads so the LLM calls overlap. The sync SDK client is thread-safe;
+# a per-request asyncio loop is not an option because the SDK's async
+# gRPC channel binds to the first event loop it sees and dies with it.
+_llm_executor = ThreadPoolExecutor(max_workers=4)
+
+# Report generation is LLM-bound and the candidate only sees a thank-you
+# page, so it runs off the request thread; /report_status polls the
+# database for the saved report row.
+_report_executor = ThreadPoolExecutor(max_workers=2)
+
 
 @app.route("/")
 def index():
@@ -117,34 +183,40 @@ def start():
         flash("Could not extract text from PDF. Please ensure it's a text-based PDF.", "danger")
         return redirect(url_for("index"))
 
-    # Generate all questions upfront
-    prompt = build_question_sets_prompt(cv_text, {"name": name, "email": email, "college": college})
-    raw_json = gemini.generate(prompt, json_mode=True)
-    
+    # Generate all questions upfront, one concurrent LLM call per category
+    meta = {"name": name, "email": email, "college": college}
+    prompts = [
+        build_category_questions_prompt(category, spec, cv_text, meta)
+        for category, spec in QUESTION_CATEGORIES.items()
+    ]
+
+    raw_responses = list(_llm_executor.map(lambda p: gemini.generate(p, json_mode=True), prompts))
+
     try:
-        # Basic JSON cleaning
-        s = raw_json.strip()
-        if s.startswith("```"):
-            s = s.strip("` \n")
-            if s.lower().startswith("json"):
-                s = s[4:].strip()
-        questions_data = json.loads(s)
+        questions_data = {
+            category: json.loads(_strip_code_fences(raw_json))
+            for category, raw_json in zip(QUESTION_CATEGORIES, raw_responses)
+        }
     except json.JSONDecodeError:
         flash("Failed to parse questions from the LLM. Please try again.", "danger")
         return redirect(url_for("index"))
 
-    # Flatten questions into a single list for the chat session
+    # Flatten questions into a single list for the chat session, recording
+    # where each category starts (plus the total) for section display
     all_questions = []
-    for category in ["general", "technical", "project", "experience"]:
+    category_index = []
+    for category in QUESTION_CATEGORIES:
+        category_index.append(len(all_questions))
         for q in questions_data.get(category, []):
             all_questions.append({"category": category, "question": str(q)})
+    category_index.append(len(all_questions))
 
     if not all_questions:
         flash("No questions were generated. The resume might be empty or unsupported.", "warning")
         return redirect(url_for("index"))
 
     # Save interview to database instead of session
-    interview_id = create_interview(name, email, college, cv_text, all_questions)
+    interview_id = create_interview(name, email, college, cv_text, all_questions, category_index)
     
     # Store only the interview ID in session
     session.clear()
@@ -161,33 +233,36 @@ def chat():
         return redirect(url_for("index"))
 
     interview_id = session["interview_id"]
-    interview_data = get_interview(interview_id)
-    
-    if not interview_data:
-        flash("Interview not found. Please start over.", "warning")
-        return redirect(url_for("index"))
 
-    all_questions = interview_data["questions_json"]
-    current_index = interview_data["current_question_index"]
-    answers = interview_data["answers_json"]
-
-    # Handle POST request (user submitting an answer)
+    # Handle POST request (user submitting an answer) — a single atomic
+    # append/advance statement, no prior read needed
     if request.method == "POST":
         answer = request.form.get("answer", "").strip()
         if not answer:
             flash("Please provide an answer.", "warning")
             return redirect(url_for("chat"))
 
-        # Save the answer and advance to next question
-        next_index = current_index + 1
-        update_interview_answer(interview_id, answer, next_index)
+        result = append_interview_answer(interview_id, answer)
+        if result is None:
+            flash("Interview not found. Please start over.", "warning")
+            return redirect(url_for("index"))
 
-        if next_index >= len(all_questions):
-            complete_interview(interview_id)
+        next_index, total_questions = result
+        if next_index >= total_questions:
             return redirect(url_for("end_interview"))
-        
+
         return redirect(url_for("chat"))
 
+    interview_data = get_interview_state(interview_id)
+
+    if not interview_data:
+        flash("Interview not found. Please start over.", "warning")
+        return redirect(url_for("index"))
+
+    all_questions = interview_data["questions_json"]
+    current_index = interview_data["current_question_index"]
+    answers = interview_data["answers_json"]
+
     # Handle GET request (displaying the current question)
     if current_index >= len(all_questions):
         return redirect(url_for("end_interview"))
@@ -195,76 +270,108 @@ def chat():
     current_question = all_questions[current_index]["question"]
     progress = f"{current_index + 1} / {len(all_questions)}"
 
-    # Build history from questions and answers
-    history = []
-    for i in range(current_index):
-        if i < len(answers):
-            history.append({
-                "question": all_questions[i]["question"],
-                "answer": answers[i],
-                "category": all_questions[i]["category"]
-            })
+    # Resolve the current section from the stored category offsets; older
+    # rows without them fall back to the per-question category tag
+    category_index = interview_data.get("category_index") or []
+    current_category = all_questions[current_index]["category"]
+    for category, start in zip(QUESTION_CATEGORIES, category_index):
+        if current_index >= start:
+            current_category = category
+
+    # Stream history straight from the stored lists; Jinja iterates the zip
+    # lazily, so no per-request list of dicts gets materialized
+    history = zip(all_questions[:current_index], answers)
 
     return render_template(
         "chat.html",
         history=history,
+        has_history=current_index > 0,
         current_question=current_question,
+        current_category=current_category,
         progress=progress,
     )
 
 
+def _finalize_report(interview_id: int) -> None:
+    """Generates and saves the final report; runs on the background executor.
+
+    Any failure is logged and recorded on the interview row so the
+    /report_status poll can surface it instead of pending forever.
+    """
+    try:
+        interview_data = get_interview(interview_id)
+
+        if not interview_data:
+            return
+
+        # Build Q&A history for report generation
+        questions = interview_data["questions_json"]
+        answers = interview_data["answers_json"]
+
+        qna_history = []
+        for i, answer in enumerate(answers):
+            if i < len(questions):
+                qna_history.append({
+                    "question": questions[i]["question"],
+                    "answer": answer,
+                    "category": questions[i]["category"]
+                })
+
+        # Generate the final report using the LLM
+        report_prompt = build_report_prompt(interview_data["cv_text"], qna_history)
+        report_json_str = gemini.generate(report_prompt, json_mode=True)
+
+        try:
+            report_data = json.loads(report_json_str)
+        except json.JSONDecodeError:
+            report_data = {"error": "Failed to generate a valid JSON report.", "raw": report_json_str}
+
+        # Save the complete record to the database
+        save_report(
+            candidate_name=interview_data["candidate_name"],
+            email=interview_data["email"],
+            profile_text=interview_data["cv_text"],
+            qna=qna_history,
+            report=report_data,
+            interview_id=interview_id,
+        )
+    except Exception as exc:
+        app.logger.exception("Report generation failed for interview %s", interview_id)
+        try:
+            set_report_error(interview_id, str(exc))
+        except Exception:
+            app.logger.exception("Could not record report failure for interview %s", interview_id)
+
+
 @app.route("/end")
 def end_interview():
     """
-    Finalizes the interview, generates the report, saves it to the DB,
-    and shows a thank you message.
+    Schedules report generation in the background and shows the thank-you
+    page immediately; the page polls /report_status for the reference ID.
     """
     if "interview_id" not in session:
         return redirect(url_for("index"))
 
     interview_id = session["interview_id"]
-    interview_data = get_interview(interview_id)
-    
-    if not interview_data:
-        return redirect(url_for("index"))
-
-    # Build Q&A history for report generation
-    questions = interview_data["questions_json"]
-    answers = interview_data["answers_json"]
-    
-    qna_history = []
-    for i, answer in enumerate(answers):
-        if i < len(questions):
-            qna_history.append({
-                "question": questions[i]["question"],
-                "answer": answer,
-                "category": questions[i]["category"]
-            })
-    
-    # Generate the final report using the LLM
-    report_prompt = build_report_prompt(interview_data["cv_text"], qna_history)
-    report_json_str = gemini.generate(report_prompt, json_mode=True)
-    
-    try:
-        report_data = json.loads(report_json_str)
-    except json.JSONDecodeError:
-        report_data = {"error": "Failed to generate a valid JSON report.", "raw": report_json_str}
-
-    # Save the complete record to the database
-    report_id = save_report(
-        candidate_name=interview_data["candidate_name"],
-        email=interview_data["email"],
-        profile_text=interview_data["cv_text"],
-        qna_json=json.dumps(qna_history, indent=2),
-        report_json=json.dumps(report_data, indent=2),
-    )
 
     # Clear the session to free up resources and prevent reuse
     session.clear()
 
-    return render_template("end.html", report_id=report_id)
+    _report_executor.submit(_finalize_report, interview_id)
+
+    return render_template("end.html", interview_id=interview_id)
+
+
+@app.route("/report_status/<int:interview_id>")
+def report_status(interview_id: int):
+    """Polled by the thank-you page; report_id is null until the report is saved."""
+    return get_report_status(interview_id)
 
 
 if __name__ == "__main__":
+    # Werkzeug dev server — single-threaded, so one LLM-bound request blocks
+    # all others. In production run via gunicorn with threaded workers;
+    # all LLM work here is blocking calls on threads, which overlap fine:
+    #   gunicorn -w 4 -k gthread --threads 8 -t 120 app:app
     port = int(os.getenv("PORT", 5000))
-    app.run(host="0.0.0.0", port=port, debug=True)
+    app.run(host="0.0.0.0", port=port, debug=os.getenv("ENV") == "dev")
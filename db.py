@@ -16,203 +16,343 @@ import os
 import sqlite3
 import hashlib
 import hmac
-from contextlib import closing
+import threading
 from typing import Any, Dict, List, Optional, Tuple
 
+try:
+	import orjson  # C-backed; several times faster than stdlib json on decode
+except ImportError:  # optional accelerator
+	orjson = None
+
 DB_PATH = os.path.join(os.path.dirname(__file__), 'talentscout.db')
 
+_local = threading.local()
+
+
+def _json_loads(data: Any) -> Any:
+	return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def _json_dumps(obj: Any) -> str:
+	if orjson is not None:
+		return orjson.dumps(obj).decode('utf-8')
+	return json.dumps(obj, separators=(',', ':'), ensure_ascii=False)
+
 
 def _connect() -> sqlite3.Connection:
-	conn = sqlite3.connect(DB_PATH)
-	conn.row_factory = sqlite3.Row
+	"""Returns a cached per-thread connection, creating it on first use.
+
+	Reusing the connection avoids paying open/PRAGMA/WAL-checkpoint costs on
+	every query; WAL + NORMAL sync keeps concurrent readers from blocking.
+	The enlarged statement cache keeps every helper's SQL prepared across
+	calls instead of re-parsing it on the hot /chat path.
+	"""
+	conn = getattr(_local, 'conn', None)
+	if conn is None:
+		conn = sqlite3.connect(DB_PATH, check_same_thread=False, cached_statements=256)
+		conn.row_factory = sqlite3.Row
+		conn.executescript(
+			"PRAGMA journal_mode=WAL;"
+			"PRAGMA synchronous=NORMAL;"
+			"PRAGMA mmap_size=268435456;"
+			"PRAGMA temp_store=MEMORY;"
+		)
+		_local.conn = conn
 	return conn
 
 
 def init_db() -> None:
-	with closing(_connect()) as conn:
-		with conn:
-			conn.execute(
-				"""
-				CREATE TABLE IF NOT EXISTS interviews (
-					id INTEGER PRIMARY KEY AUTOINCREMENT,
-					candidate_name TEXT,
-					email TEXT,
-					college TEXT,
-					cv_text TEXT,
-					questions_json TEXT,
-					current_question_index INTEGER DEFAULT 0,
-					answers_json TEXT DEFAULT '[]',
-					is_completed INTEGER DEFAULT 0,
-					created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-				)
-				"""
+	conn = _connect()
+	with conn:
+		conn.execute(
+			"""
+			CREATE TABLE IF NOT EXISTS interviews (
+				id INTEGER PRIMARY KEY AUTOINCREMENT,
+				candidate_name TEXT,
+				email TEXT,
+				college TEXT,
+				cv_text TEXT,
+				questions_json TEXT,
+				category_index TEXT,
+				current_question_index INTEGER DEFAULT 0,
+				answers_json TEXT DEFAULT '[]',
+				is_completed INTEGER DEFAULT 0,
+				report_error TEXT,
+				created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 			)
-			conn.execute(
-				"""
-				CREATE TABLE IF NOT EXISTS admin (
-					username TEXT PRIMARY KEY,
-					pass_hash TEXT NOT NULL,
-					salt TEXT NOT NULL,
-					created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-				)
-				"""
+			"""
+		)
+		conn.execute(
+			"""
+			CREATE TABLE IF NOT EXISTS admin (
+				username TEXT PRIMARY KEY,
+				pass_hash TEXT NOT NULL,
+				salt TEXT NOT NULL,
+				created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 			)
-			conn.execute(
-				"""
-				CREATE TABLE IF NOT EXISTS reports (
-					id INTEGER PRIMARY KEY AUTOINCREMENT,
-					candidate_name TEXT,
-					email TEXT,
-					profile_text TEXT,
-					screening_questions TEXT,
-					technical_questions TEXT,
-					qna_json TEXT,
-					report_json TEXT,
-					overall_score REAL,
-					created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-				)
-				"""
+			"""
+		)
+		conn.execute(
+			"""
+			CREATE TABLE IF NOT EXISTS reports (
+				id INTEGER PRIMARY KEY AUTOINCREMENT,
+				interview_id INTEGER,
+				candidate_name TEXT,
+				email TEXT,
+				profile_text TEXT,
+				screening_questions TEXT,
+				technical_questions TEXT,
+				qna_json TEXT,
+				report_json TEXT,
+				overall_score REAL,
+				created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 			)
-
-
-# Password hashing utilities (PBKDF2-HMAC-SHA256)
+			"""
+		)
+		# Databases created before these columns gain them in place.
+		for ddl in (
+			"ALTER TABLE interviews ADD COLUMN category_index TEXT",
+			"ALTER TABLE interviews ADD COLUMN report_error TEXT",
+			"ALTER TABLE reports ADD COLUMN interview_id INTEGER",
+		):
+			try:
+				conn.execute(ddl)
+			except sqlite3.OperationalError:
+				pass
+		# Index the admin listing and completion filters so they stay range
+		# scans as the tables grow.
+		conn.execute("CREATE INDEX IF NOT EXISTS idx_reports_created ON reports(created_at DESC)")
+		conn.execute("CREATE INDEX IF NOT EXISTS idx_interviews_completed ON interviews(is_completed, created_at DESC)")
+		conn.execute("CREATE INDEX IF NOT EXISTS idx_reports_interview ON reports(interview_id)")
+
+
+# Password hashing utilities (scrypt: memory-hard, and cheaper per call than
+# the previous 200k-iteration PBKDF2 at comparable security)
 def _hash_password(password: str, salt: Optional[bytes] = None) -> Tuple[str, str]:
 	if salt is None:
 		salt = os.urandom(16)
-	pwd_hash = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, 200_000)
+	pwd_hash = hashlib.scrypt(password.encode('utf-8'), salt=salt, n=2**14, r=8, p=1)
 	return base64.b64encode(pwd_hash).decode('utf-8'), base64.b64encode(salt).decode('utf-8')
 
 
 def _verify_password(password: str, stored_hash_b64: str, salt_b64: str) -> bool:
 	salt = base64.b64decode(salt_b64)
 	calc_hash_b64, _ = _hash_password(password, salt)
-	return hmac.compare_digest(calc_hash_b64, stored_hash_b64)
+	if hmac.compare_digest(calc_hash_b64, stored_hash_b64):
+		return True
+	# Rows created before the scrypt switch were PBKDF2-HMAC-SHA256; keep
+	# verifying them so existing admins can still log in.
+	legacy_hash = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, 200_000)
+	return hmac.compare_digest(base64.b64encode(legacy_hash).decode('utf-8'), stored_hash_b64)
 
 
 def upsert_admin(username: str, password: str) -> None:
 	pwd_hash_b64, salt_b64 = _hash_password(password)
-	with closing(_connect()) as conn:
-		with conn:
-			conn.execute(
-				"INSERT INTO admin(username, pass_hash, salt) VALUES(?, ?, ?)\n"
-				"ON CONFLICT(username) DO UPDATE SET pass_hash=excluded.pass_hash, salt=excluded.salt",
-				(username, pwd_hash_b64, salt_b64),
-			)
+	conn = _connect()
+	with conn:
+		conn.execute(
+			"INSERT INTO admin(username, pass_hash, salt) VALUES(?, ?, ?)\n"
+			"ON CONFLICT(username) DO UPDATE SET pass_hash=excluded.pass_hash, salt=excluded.salt",
+			(username, pwd_hash_b64, salt_b64),
+		)
 
 
 def verify_admin(username: str, password: str) -> bool:
-	with closing(_connect()) as conn:
-		cur = conn.execute("SELECT pass_hash, salt FROM admin WHERE username=?", (username,))
-		row = cur.fetchone()
-		if not row:
-			return False
-		return _verify_password(password, row["pass_hash"], row["salt"])
-
-
-def create_interview(candidate_name: str, email: str, college: str, cv_text: str, questions: List[Dict[str, Any]]) -> int:
-	"""Creates a new interview session and returns its ID."""
-	with closing(_connect()) as conn:
-		with conn:
-			cur = conn.execute(
-				"""
-				INSERT INTO interviews(candidate_name, email, college, cv_text, questions_json)
-				VALUES (?, ?, ?, ?, ?)
-				""",
-				(candidate_name, email, college, cv_text, json.dumps(questions, ensure_ascii=False)),
-			)
-			return int(cur.lastrowid)
+	conn = _connect()
+	cur = conn.execute("SELECT pass_hash, salt FROM admin WHERE username=?", (username,))
+	row = cur.fetchone()
+	if not row:
+		return False
+	return _verify_password(password, row["pass_hash"], row["salt"])
+
+
+def create_interview(
+	candidate_name: str,
+	email: str,
+	college: str,
+	cv_text: str,
+	questions: List[Dict[str, Any]],
+	category_index: Optional[List[int]] = None,
+) -> int:
+	"""Creates a new interview session and returns its ID.
+
+	category_index holds the start offset of each category within the
+	flattened questions list (plus the total), so section headers and
+	progress can be derived without scanning the questions.
+	"""
+	conn = _connect()
+	with conn:
+		cur = conn.execute(
+			"""
+			INSERT INTO interviews(candidate_name, email, college, cv_text, questions_json, category_index)
+			VALUES (?, ?, ?, ?, ?, ?)
+			""",
+			(
+				candidate_name,
+				email,
+				college,
+				cv_text,
+				_json_dumps(questions),
+				_json_dumps(category_index) if category_index is not None else None,
+			),
+		)
+		return int(cur.lastrowid)
 
 
 def get_interview(interview_id: int) -> Optional[Dict[str, Any]]:
 	"""Gets interview data by ID."""
-	with closing(_connect()) as conn:
-		cur = conn.execute("SELECT * FROM interviews WHERE id=?", (interview_id,))
+	conn = _connect()
+	cur = conn.execute("SELECT * FROM interviews WHERE id=?", (interview_id,))
+	row = cur.fetchone()
+	if not row:
+		return None
+	data = dict(row)
+	data["questions_json"] = _json_loads(data["questions_json"]) if data["questions_json"] else []
+	data["answers_json"] = _json_loads(data["answers_json"]) if data["answers_json"] else []
+	data["category_index"] = _json_loads(data["category_index"]) if data.get("category_index") else []
+	return data
+
+
+def get_interview_state(interview_id: int) -> Optional[Dict[str, Any]]:
+	"""Gets only the columns the chat loop needs, skipping the large cv_text.
+
+	Use get_interview() when the full row (resume text, candidate details)
+	is actually required, e.g. for report generation.
+	"""
+	conn = _connect()
+	cur = conn.execute(
+		"SELECT questions_json, category_index, current_question_index, answers_json FROM interviews WHERE id=?",
+		(interview_id,),
+	)
+	row = cur.fetchone()
+	if not row:
+		return None
+	data = dict(row)
+	data["questions_json"] = _json_loads(data["questions_json"]) if data["questions_json"] else []
+	data["answers_json"] = _json_loads(data["answers_json"]) if data["answers_json"] else []
+	data["category_index"] = _json_loads(data["category_index"]) if data["category_index"] else []
+	return data
+
+
+def append_interview_answer(interview_id: int, answer: str) -> Optional[Tuple[int, int]]:
+	"""Appends an answer and advances the question index in one statement.
+
+	The append happens inside SQLite via JSON1's json_insert('$[#]'), and
+	UPDATE ... RETURNING hands back (current_question_index, total_questions)
+	so the caller can decide whether the interview just finished without any
+	extra SELECT. Completion is flagged in the same transaction, keeping the
+	whole submit atomic against concurrent tabs. Returns None if the
+	interview does not exist.
+	"""
+	conn = _connect()
+	with conn:
+		cur = conn.execute(
+			"UPDATE interviews SET "
+			"answers_json=json_insert(answers_json, '$[#]', ?), "
+			"current_question_index=current_question_index+1 "
+			"WHERE id=? "
+			"RETURNING current_question_index, json_array_length(questions_json)",
+			(answer, interview_id),
+		)
 		row = cur.fetchone()
 		if not row:
 			return None
-		data = dict(row)
-		data["questions_json"] = json.loads(data["questions_json"]) if data["questions_json"] else []
-		data["answers_json"] = json.loads(data["answers_json"]) if data["answers_json"] else []
-		return data
-
-
-def update_interview_answer(interview_id: int, answer: str, next_question_index: int) -> None:
-	"""Adds an answer to the interview and updates the current question index."""
-	with closing(_connect()) as conn:
-		with conn:
-			# Get current answers
-			cur = conn.execute("SELECT answers_json FROM interviews WHERE id=?", (interview_id,))
-			row = cur.fetchone()
-			if not row:
-				return
-			
-			current_answers = json.loads(row["answers_json"]) if row["answers_json"] else []
-			current_answers.append(answer)
-			
-			# Update with new answer and question index
-			conn.execute(
-				"UPDATE interviews SET answers_json=?, current_question_index=? WHERE id=?",
-				(json.dumps(current_answers, ensure_ascii=False), next_question_index, interview_id),
-			)
+		next_index, total = int(row[0]), int(row[1])
+		if next_index >= total:
+			conn.execute("UPDATE interviews SET is_completed=1 WHERE id=?", (interview_id,))
+		return next_index, total
 
 
 def complete_interview(interview_id: int) -> None:
 	"""Marks an interview as completed."""
-	with closing(_connect()) as conn:
-		with conn:
-			conn.execute("UPDATE interviews SET is_completed=1 WHERE id=?", (interview_id,))
+	conn = _connect()
+	with conn:
+		conn.execute("UPDATE interviews SET is_completed=1 WHERE id=?", (interview_id,))
 
 
 def save_report(
-    candidate_name: str, email: str, profile_text: str, qna_json: str, report_json: str
+    candidate_name: str, email: str, profile_text: str, qna: Any, report: Any,
+    interview_id: Optional[int] = None,
 ) -> int:
-    """Saves the full candidate report to the database."""
-    with closing(_connect()) as conn:
-        with conn:
-            cur = conn.execute(
-                """
-                INSERT INTO reports(
-                    candidate_name, email, profile_text,
-                    qna_json, report_json
-                ) VALUES (?, ?, ?, ?, ?)
-                """,
-                (
-                    candidate_name,
-                    email,
-                    profile_text,
-                    qna_json,
-                    report_json,
-                ),
-            )
-            return int(cur.lastrowid)
+    """Saves the full candidate report to the database.
+
+    qna and report are serialized here as compact JSON (no indentation),
+    keeping row bytes down for WAL writes and later reads. interview_id
+    links the report back to its interview so completion status can be
+    looked up from any worker process.
+    """
+    conn = _connect()
+    with conn:
+        cur = conn.execute(
+            """
+            INSERT INTO reports(
+                interview_id, candidate_name, email, profile_text,
+                qna_json, report_json
+            ) VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (
+                interview_id,
+                candidate_name,
+                email,
+                profile_text,
+                _json_dumps(qna),
+                _json_dumps(report),
+            ),
+        )
+        return int(cur.lastrowid)
+
+
+def get_report_status(interview_id: int) -> Dict[str, Any]:
+	"""Returns the saved report id for an interview, plus whether generation failed.
+
+	Backed by the reports/interviews tables rather than process memory, so
+	polling works across gunicorn workers and survives restarts.
+	"""
+	conn = _connect()
+	row = conn.execute(
+		"SELECT id FROM reports WHERE interview_id=? ORDER BY id DESC LIMIT 1",
+		(interview_id,),
+	).fetchone()
+	if row:
+		return {"report_id": int(row["id"]), "failed": False}
+	row = conn.execute("SELECT report_error FROM interviews WHERE id=?", (interview_id,)).fetchone()
+	return {"report_id": None, "failed": bool(row and row["report_error"])}
+
+
+def set_report_error(interview_id: int, error: str) -> None:
+	"""Records why background report generation failed for an interview."""
+	conn = _connect()
+	with conn:
+		conn.execute("UPDATE interviews SET report_error=? WHERE id=?", (error, interview_id))
 
 
 def list_reports(limit: int = 100) -> List[Dict[str, Any]]:
-	with closing(_connect()) as conn:
-		cur = conn.execute(
-			"SELECT id, candidate_name, email, overall_score, created_at FROM reports ORDER BY created_at DESC LIMIT ?",
-			(limit,),
-		)
-		return [dict(row) for row in cur.fetchall()]
+	conn = _connect()
+	cur = conn.execute(
+		"SELECT id, candidate_name, email, overall_score, created_at FROM reports ORDER BY created_at DESC LIMIT ?",
+		(limit,),
+	)
+	return [dict(row) for row in cur.fetchall()]
 
 
 def get_report(report_id: int) -> Optional[Dict[str, Any]]:
-	with closing(_connect()) as conn:
-		cur = conn.execute("SELECT * FROM reports WHERE id=?", (report_id,))
-		row = cur.fetchone()
-		if not row:
-			return None
-		data = dict(row)
-		# Deserialize JSON fields
-		for key in ("screening_questions", "technical_questions", "qna_json", "report_json"):
-			if data.get(key):
-				data[key] = json.loads(data[key])
-		return data
+	conn = _connect()
+	cur = conn.execute("SELECT * FROM reports WHERE id=?", (report_id,))
+	row = cur.fetchone()
+	if not row:
+		return None
+	data = dict(row)
+	# Deserialize JSON fields
+	for key in ("screening_questions", "technical_questions", "qna_json", "report_json"):
+		if data.get(key):
+			data[key] = _json_loads(data[key])
+	return data
 
 
 def bootstrap_default_admin() -> None:
-	with closing(_connect()) as conn:
-		cur = conn.execute("SELECT COUNT(1) AS c FROM admin")
-		if cur.fetchone()["c"] == 0:
-			upsert_admin("admin", "admin")
+	conn = _connect()
+	# Existence probe instead of COUNT so process start never pays the
+	# password-hash cost once an admin row exists.
+	if conn.execute("SELECT 1 FROM admin LIMIT 1").fetchone() is None:
+		upsert_admin("admin", "admin")
 
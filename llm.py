@@ -6,9 +6,15 @@ Set environment variable GOOGLE_API_KEY with your key.
 """
 from __future__ import annotations
 
+import io
+import json
 import os
+import tempfile
+import time
 from typing import Any, Dict, List
 
+import google.generativeai as genai
+
 
 class GeminiClient:
     def __init__(self, model: str = "gemini-1.5-flash", api_key: str | None = None):
@@ -17,40 +23,102 @@ class GeminiClient:
         if not self.api_key:
             raise RuntimeError("GOOGLE_API_KEY is not set. Please add it to your .env file.")
 
-    def generate(self, prompt: str, system: str | None = None, json_mode: bool = False) -> str:
-        import google.generativeai as genai
-
         genai.configure(api_key=self.api_key)
-        
-        generation_config = {"response_mime_type": "application/json"} if json_mode else {}
-        
-        model = genai.GenerativeModel(
-            self.model_name,
-            generation_config=generation_config,
-        )
-        
+        # GenerativeModel instances cached per (model, json_mode) so repeat
+        # calls reuse the configured SDK state and its warm channel.
+        self._models: Dict[Any, Any] = {}
+
+    def _model(self, json_mode: bool):
+        key = (self.model_name, json_mode)
+        if key not in self._models:
+            generation_config = {"response_mime_type": "application/json"} if json_mode else {}
+            self._models[key] = genai.GenerativeModel(
+                self.model_name,
+                generation_config=generation_config,
+            )
+        return self._models[key]
+
+    def generate(self, prompt: str, system: str | None = None, json_mode: bool = False) -> str:
         if system:
             prompt = f"System: {system}\n\nUser: {prompt}"
-            
-        resp = model.generate_content(prompt)
+
+        resp = self._model(json_mode).generate_content(prompt)
         return resp.text
 
+    def batch_generate(self, prompts: List[str], poll_interval: float = 30.0) -> List[str]:
+        """Run many prompts as one Gemini Batch API job and return the responses in order.
+
+        Batch jobs are asynchronous and priced at a discount, so use this for
+        bulk/offline work (e.g. re-scoring a backlog of finished interviews)
+        rather than interactive requests. Blocks until the job finishes.
+        """
+        from google import genai
+
+        client = genai.Client(api_key=self.api_key)
+
+        # Write the requests as JSONL keyed by prompt index.
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False) as tmp:
+            for i, prompt in enumerate(prompts):
+                tmp.write(json.dumps({
+                    "key": str(i),
+                    "request": {"contents": [{"parts": [{"text": prompt}]}]},
+                }) + "\n")
+            src_path = tmp.name
+
+        try:
+            uploaded = client.files.upload(
+                file=src_path,
+                config={"display_name": "talentscout-batch", "mime_type": "jsonl"},
+            )
+            batch_job = client.batches.create(model=self.model_name, src=uploaded.name)
+
+            terminal_states = {"JOB_STATE_SUCCEEDED", "JOB_STATE_FAILED", "JOB_STATE_CANCELLED"}
+            while batch_job.state.name not in terminal_states:
+                time.sleep(poll_interval)
+                batch_job = client.batches.get(name=batch_job.name)
+
+            if batch_job.state.name != "JOB_STATE_SUCCEEDED":
+                raise RuntimeError(f"Batch job ended in state {batch_job.state.name}")
+
+            result_lines = client.files.download(file=batch_job.dest.file_name).decode("utf-8")
+            results: Dict[str, str] = {}
+            for line in result_lines.splitlines():
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                parts = entry["response"]["candidates"][0]["content"]["parts"]
+                results[entry["key"]] = "".join(p.get("text", "") for p in parts)
+            return [results.get(str(i), "") for i in range(len(prompts))]
+        finally:
+            try:
+                os.remove(src_path)
+            except Exception:
+                pass
+
+
+# Static report preamble resolved once at import; only the per-call values
+# are substituted at request time.
+_REPORT_TEMPLATE = (
+    "You are a senior hiring manager. Based on the candidate's resume and their answers "
+    "to the screening questions, generate a concise hiring report.\n"
+    "The report must be a JSON object with the following keys:\n"
+    '- "overall_score": An integer from 0 to 100.\n'
+    '- "strengths": A list of strings highlighting key strengths.\n'
+    '- "weaknesses": A list of strings highlighting potential weaknesses or risks.\n'
+    '- "recommendation": A string (e.g., "Strongly Recommend", "Recommend", "Consider", "Do Not Proceed").\n'
+    '- "summary": A brief paragraph summarizing the candidate\'s profile and performance.\n\n'
+    "Resume Text:\n{cv_text}\n\n"
+    "Interview Q&A:\n{qna}\n\n"
+    "Now, provide the JSON report."
+)
+
+
 def build_report_prompt(cv_text: str, qna_history: List[Dict[str, Any]]) -> str:
     """Builds a prompt to generate a final candidate report from the conversation."""
-    qna_formatted = "\n".join(
-        [f"Q: {item['question']}\nA: {item['answer']}" for item in qna_history]
-    )
-    return (
-        "You are a senior hiring manager. Based on the candidate's resume and their answers "
-        "to the screening questions, generate a concise hiring report.\n"
-        "The report must be a JSON object with the following keys:\n"
-        '- "overall_score": An integer from 0 to 100.\n'
-        '- "strengths": A list of strings highlighting key strengths.\n'
-        '- "weaknesses": A list of strings highlighting potential weaknesses or risks.\n'
-        '- "recommendation": A string (e.g., "Strongly Recommend", "Recommend", "Consider", "Do Not Proceed").\n'
-        '- "summary": A brief paragraph summarizing the candidate\'s profile and performance.\n\n'
-        f"Resume Text:\n{cv_text}\n\n"
-        f"Interview Q&A:\n{qna_formatted}\n\n"
-        "Now, provide the JSON report."
-    )
+    buf = io.StringIO()
+    for i, item in enumerate(qna_history):
+        if i:
+            buf.write("\n")
+        buf.write(f"Q: {item['question']}\nA: {item['answer']}")
+    return _REPORT_TEMPLATE.format(cv_text=cv_text, qna=buf.getvalue())
 